@@ -3,15 +3,26 @@ TriageFlow - FastAPI Backend
 Reasoning-First Triage System with Gemini 1.5 Flash Integration
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, ValidationError
-from typing import Optional, List
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import Optional, List, Literal, Tuple
+from cachetools import TTLCache
 import google.generativeai as genai
+import httpx
+import numpy as np
+import orjson
 import os
 import logging
 import re
-from datetime import datetime
+import hashlib
+import asyncio
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -21,22 +32,79 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup/shutdown hooks: open the shared HTTP client; on shutdown, flush
+    queued batch jobs and let in-flight background tasks (MATS dispatch)
+    finish before releasing it.
+    """
+    # One pooled client for all outbound HTTP, so keep-alive connections
+    # are reused instead of paying DNS + TLS setup per call
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        http2=True
+    )
+    
+    yield
+    
+    # Don't wait out the batch timer: cancel it and run queued jobs now
+    if _batch_flush_timer is not None:
+        _batch_flush_timer.cancel()
+    try:
+        await asyncio.wait_for(flush_batch_queue(), timeout=BATCH_SHUTDOWN_FLUSH_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error("Batch queue flush timed out on shutdown - unfinished jobs are lost")
+    
+    if _BACKGROUND_TASKS:
+        await asyncio.wait(_BACKGROUND_TASKS, timeout=SHUTDOWN_GRACE_SECONDS)
+    await app.state.http.aclose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="TriageFlow API",
     description="Reasoning-First Medical Triage System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# CORS middleware for React frontend
+# CORS middleware for React frontend (comma-separated FRONTEND_ORIGIN).
+# Explicit origins and a long max_age let browsers cache the preflight.
+FRONTEND_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("FRONTEND_ORIGIN", "http://localhost:3000").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify exact origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=FRONTEND_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
+    max_age=86400,
 )
 
+# Routes never gzipped: compressing server-sent events buffers them until the
+# compressor flushes, which defeats streaming. Older Starlette releases allowed
+# by the fastapi floor do compress text/event-stream, so exclude explicitly.
+GZIP_EXCLUDED_PATHS = frozenset({"/triage/stream"})
+
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes GZIP_EXCLUDED_PATHS through uncompressed."""
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"] in GZIP_EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compress larger responses (reasoning traces) for low-bandwidth clinics
+app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=500)
+
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 if GEMINI_API_KEY:
@@ -44,15 +112,86 @@ if GEMINI_API_KEY:
 else:
     logger.warning("GEMINI_API_KEY not set - API will use fallback safety mode")
 
+# Gemini model used for every triage call
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+
+# Exact-match response cache for repeated symptom descriptions
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+_RESPONSE_CACHE: TTLCache = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
+_RESPONSE_CACHE_STATS = {"hits": 0, "misses": 0}
+
+# Semantic cache for paraphrased descriptions (off by default)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_MAXSIZE = int(os.getenv("SEMANTIC_CACHE_MAXSIZE", "1024"))
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_DIM = 768
+# Ring buffer: row i of the vectors matches slot i of the responses;
+# _semantic_cache_next is the slot overwritten by the next store. Allocated
+# on the first store, so a disabled cache costs nothing.
+_SEMANTIC_CACHE_VECTORS: Optional[np.ndarray] = None
+_SEMANTIC_CACHE_RESPONSES: list = []
+_semantic_cache_size = 0
+_semantic_cache_next = 0
+_SEMANTIC_CACHE_STATS = {"hits": 0, "misses": 0}
+
+# Deterministic Level 5 short-circuit for clearly routine requests
+KEYWORD_TRIAGE_ENABLED = os.getenv("KEYWORD_TRIAGE_ENABLED", "false").lower() == "true"
+KEYWORD_TRIAGE_MAX_CHARS = 200
+_KEYWORD_TRIAGE_REVIEW_QUEUE: deque = deque(maxlen=1000)
+# Durable audit trail (JSON lines) for short-circuit decisions; the in-memory
+# review queue above is lost on restart. Neither stores the patient's text.
+KEYWORD_TRIAGE_AUDIT_PATH = os.getenv("KEYWORD_TRIAGE_AUDIT_PATH", "")
+
+# On an unparseable response, race a reformat request against a fresh
+# generation instead of going straight to the safety fallback.
+# Off by default: it doubles token spend on the retry path.
+HEDGE_ON_RETRY = os.getenv("HEDGE_ON_RETRY", "false").lower() == "true"
+
+# Deferred queue for non-urgent (priority="batch") triage requests.
+# Not the Gemini Batch API: jobs run on the same model, price and quota as
+# realtime /triage, so concurrency stays low to leave that quota for it.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "100"))
+BATCH_MAX_WAIT_SECONDS = float(os.getenv("BATCH_MAX_WAIT_SECONDS", "60"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+BATCH_JOB_TTL_SECONDS = int(os.getenv("BATCH_JOB_TTL_SECONDS", "86400"))
+_BATCH_QUEUE: list = []
+_BATCH_JOBS: TTLCache = TTLCache(maxsize=100_000, ttl=BATCH_JOB_TTL_SECONDS)
+_batch_flush_timer: Optional[asyncio.Task] = None
+# Jobs live only in memory, so shutdown drains the queue instead of dropping it
+BATCH_SHUTDOWN_FLUSH_SECONDS = float(os.getenv("BATCH_SHUTDOWN_FLUSH_SECONDS", "30"))
+
+# MATS ambulance dispatch integration (mock/log-only unless both are set)
+MATS_API_ENDPOINT = os.getenv("MATS_API_ENDPOINT", "")
+MATS_API_KEY = os.getenv("MATS_API_KEY", "")
+MATS_TIMEOUT_SECONDS = float(os.getenv("MATS_TIMEOUT_SECONDS", "2.0"))
+
+# Time allowed on shutdown for in-flight background tasks to finish
+SHUTDOWN_GRACE_SECONDS = 5.0
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+_BACKGROUND_TASKS: set = set()
+
+
+def utc_timestamp() -> str:
+    """Current time as a timezone-aware ISO 8601 UTC string."""
+    return datetime.now(timezone.utc).isoformat()
+
 
 # Request/Response Models
 class TriageRequest(BaseModel):
     text_description: str = Field(..., description="Patient symptom description")
     image_url: Optional[str] = Field(None, description="Optional image URL for visual triage")
+    priority: Literal["realtime", "batch"] = Field(
+        "realtime", description="'batch' defers non-urgent/retrospective triage to a background queue"
+    )
 
 
 class GeminiTriageOutput(BaseModel):
     """Pydantic model for Gemini's expected JSON output"""
+    model_config = ConfigDict(frozen=True)
+    
     reasoning_steps: List[str] = Field(..., description="Step-by-step reasoning")
     urgency_level: int = Field(..., ge=1, le=5, description="1=Life-threatening, 5=Non-urgent")
     uncertainty_score: float = Field(..., ge=0.0, le=1.0, description="Model uncertainty")
@@ -61,16 +200,34 @@ class GeminiTriageOutput(BaseModel):
 
 
 class TriageResponse(BaseModel):
+    # Frozen: cached instances are shared across requests
+    model_config = ConfigDict(frozen=True)
+    
     urgency_level: int = Field(..., ge=1, le=5, description="1=Life-threatening, 5=Non-urgent")
     clinical_reasoning: str = Field(..., description="Detailed CoT reasoning trace")
     uncertainty_score: float = Field(..., ge=0.0, le=1.0, description="Model confidence uncertainty")
     safety_flag: bool = Field(..., description="True if high uncertainty or ambiguous symptoms")
     dispatch_ambulance: bool = Field(..., description="True if immediate ambulance needed")
-    timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
+    timestamp: str = Field(default_factory=utc_timestamp)
+
+
+class BatchJobStatus(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    job_id: str = Field(..., description="Batch job identifier")
+    status: Literal["queued", "running", "completed"] = Field(..., description="Job state")
+    result: Optional[TriageResponse] = Field(None, description="Triage result once completed")
+    dispatched: bool = Field(
+        False, description="Always false: batch jobs never trigger MATS, even when dispatch_ambulance is true"
+    )
+
+
+# Heading that marks a safety-fallback response (never cached or reused)
+SAFETY_FALLBACK_HEADER = "**SYSTEM ERROR - SAFETY FALLBACK ACTIVATED**"
 
 
-# Chain-of-Thought System Prompt for Gemini
-TRIAGE_SYSTEM_PROMPT = """You are an expert medical triage AI assistant for a rural healthcare clinic. Your role is to perform systematic triage assessment using Chain-of-Thought (CoT) reasoning.
+# Chain-of-Thought System Instruction for Gemini (static, cacheable prefix)
+TRIAGE_SYSTEM_INSTRUCTION = """You are an expert medical triage AI assistant for a rural healthcare clinic. Your role is to perform systematic triage assessment using Chain-of-Thought (CoT) reasoning.
 
 **CRITICAL INSTRUCTIONS:**
 1. You MUST provide detailed step-by-step reasoning before assigning an urgency level.
@@ -85,7 +242,7 @@ TRIAGE_SYSTEM_PROMPT = """You are an expert medical triage AI assistant for a ru
 - Level 5: Non-urgent (routine care, minor ailments)
 
 **RESPONSE FORMAT (JSON):**
-{{
+{
   "reasoning_steps": [
     "Step 1: Identify key symptoms...",
     "Step 2: Assess severity indicators...",
@@ -96,219 +253,758 @@ TRIAGE_SYSTEM_PROMPT = """You are an expert medical triage AI assistant for a ru
   "uncertainty_score": <0.0-1.0>,
   "red_flags": ["list any concerning symptoms"],
   "recommended_action": "brief action summary"
-}}
+}"""
 
-**INPUT:** Patient describes: {symptoms}
+# Per-request prompt - the only part that changes between calls
+TRIAGE_USER_PROMPT = """**INPUT:** Patient describes: {symptoms}
 
 **YOUR ANALYSIS:**"""
 
+# Hedged retry prompt: reformat a response that failed validation
+TRIAGE_REFORMAT_PROMPT = """The previous response was not valid JSON matching the required schema.
+Please reformat the exact same medical analysis as strict JSON.
+
+Previous response to reformat:
+{previous_response}"""
+
+# Gemini structured-output schema matching GeminiTriageOutput. The SDK's
+# Schema proto rejects minimum/maximum, so the 1-5 and 0.0-1.0 ranges are
+# enforced only by Pydantic after the response arrives
+GEMINI_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reasoning_steps": {"type": "array", "items": {"type": "string"}},
+        "urgency_level": {"type": "integer", "description": "1=Life-threatening, 5=Non-urgent"},
+        "uncertainty_score": {"type": "number", "description": "Model uncertainty (0.0-1.0)"},
+        "red_flags": {"type": "array", "items": {"type": "string"}},
+        "recommended_action": {"type": "string"}
+    },
+    "required": ["reasoning_steps", "urgency_level", "uncertainty_score", "red_flags", "recommended_action"]
+}
+STRUCTURED_OUTPUT_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": GEMINI_RESPONSE_SCHEMA
+}
+
+
+def build_triage_model():
+    """Build the Gemini model handle with the static system instruction."""
+    return genai.GenerativeModel(
+        GEMINI_MODEL_NAME,
+        system_instruction=TRIAGE_SYSTEM_INSTRUCTION,
+        generation_config=STRUCTURED_OUTPUT_CONFIG
+    )
+
 
-def extract_numbered_steps_from_text(text: str) -> List[str]:
+# Shared model handle - built once at import
+GEMINI_MODEL = build_triage_model() if GEMINI_API_KEY else None
+
+
+def parse_gemini_response(response_text: str) -> GeminiTriageOutput:
     """
-    Fallback: Extract numbered list from text using regex if JSON parsing fails.
-    Matches patterns like:
-    - 1. Step one
-    - Step 1: Something
-    - 1) Step one
+    Parse Gemini's structured JSON response using Pydantic validation.
+    Output is constrained by GEMINI_RESPONSE_SCHEMA, so no code-block
+    stripping or regex recovery is needed. model_validate_json parses and
+    validates in a single pass in pydantic-core, without an intermediate dict.
     """
-    patterns = [
-        r'(?:^|\n)\s*(\d+)\.\s+(.+?)(?=\n\s*\d+\.|$)',  # 1. Step
-        r'(?:^|\n)\s*Step\s+(\d+):\s+(.+?)(?=\n\s*Step\s+\d+:|$)',  # Step 1:
-        r'(?:^|\n)\s*(\d+)\)\s+(.+?)(?=\n\s*\d+\)|$)',  # 1) Step
-    ]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Raw Gemini response (first 500 chars): %s", response_text[:500])
     
-    steps = []
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.MULTILINE | re.DOTALL)
-        if matches:
-            steps = [match[1].strip() if isinstance(match, tuple) else match.strip() 
-                    for match in matches]
-            break
-    
-    return steps if steps else ["Unable to extract structured reasoning from response"]
+    try:
+        gemini_output = GeminiTriageOutput.model_validate_json(response_text)
+        logger.debug("Successfully validated with Pydantic model")
+        return gemini_output
+        
+    except ValidationError as e:
+        logger.error("Parse/validation error (%s): %s", type(e).__name__, e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Full raw response: %s", response_text)
+        raise
 
 
-def parse_gemini_response(response_text: str) -> GeminiTriageOutput:
+# Patterns for extracting closed fields from a partially streamed JSON response
+# Field keys are located with str.find from a stored offset, then each value
+# is matched in place, so every chunk only scans text not searched before
+_STREAM_URGENCY_KEY = '"urgency_level"'
+_STREAM_URGENCY_VALUE_RE = re.compile(r'\s*:\s*([1-5])\s*[,}]')
+_STREAM_STEPS_KEY = '"reasoning_steps"'
+_STREAM_STEPS_START_RE = re.compile(r'\s*:\s*\[')
+_STREAM_STEP_ITEM_RE = re.compile(r'\s*("(?:[^"\\]|\\.)*")\s*([,\]])')
+_STREAM_EMPTY_ARRAY_END_RE = re.compile(r'\s*\]')
+_STREAM_ACTION_KEY = '"recommended_action"'
+_STREAM_ACTION_VALUE_RE = re.compile(r'\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class StreamingTriageParser:
     """
-    Parse Gemini's JSON response using Pydantic validation.
-    Falls back to regex extraction if reasoning_steps is missing.
+    Incremental parser for a streamed Gemini JSON response.
+    feed() returns (event, data) pairs for each field that closed in the
+    accumulated buffer: urgency_level, each reasoning step, recommended_action.
+    Events follow the order of the fields in Gemini's output.
+    The full buffer is still validated with parse_gemini_response at the end.
     """
-    import json
     
-    logger.info(f"Raw Gemini response (first 500 chars): {response_text[:500]}")
+    def __init__(self):
+        self.buffer = ""
+        self.urgency_level: Optional[int] = None
+        self.recommended_action: Optional[str] = None
+        self.steps_emitted = 0
+        self._steps_pos: Optional[int] = None
+        self._steps_done = False
+        self._key_scan_pos: dict = {}
+        self._value_pos: dict = {}
     
-    try:
-        # Try to extract JSON from code blocks if present
-        json_match = re.search(r'```(?:[a-zA-Z]+)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-        if json_match:
-            response_text = json_match.group(1)
-            logger.info("Extracted JSON from code block")
+    def _match_value(self, key: str, value_re: re.Pattern) -> Optional[re.Match]:
+        """Match the value after key, searching for the key only in new text."""
+        pos = self._value_pos.get(key)
+        if pos is None:
+            found = self.buffer.find(key, self._key_scan_pos.get(key, 0))
+            if found == -1:
+                # Rescan a key-length tail next time: the key may straddle chunks
+                self._key_scan_pos[key] = max(0, len(self.buffer) - len(key) + 1)
+                return None
+            pos = self._value_pos[key] = found + len(key)
+        return value_re.match(self.buffer, pos)
+    
+    def feed(self, chunk: str) -> List[tuple]:
+        self.buffer += chunk
+        events = []
         
-        # Parse JSON
-        parsed = json.loads(response_text)
-        logger.info(f"Successfully parsed JSON with keys: {list(parsed.keys())}")
+        if self.urgency_level is None:
+            match = self._match_value(_STREAM_URGENCY_KEY, _STREAM_URGENCY_VALUE_RE)
+            if match:
+                self.urgency_level = int(match.group(1))
+                events.append(("urgency_level", {"urgency_level": self.urgency_level}))
         
-        # If reasoning_steps is missing, try to extract from text
-        if 'reasoning_steps' not in parsed or not parsed['reasoning_steps']:
-            logger.warning("reasoning_steps missing, attempting regex extraction from original response")
-            # Use original response_text before JSON extraction
-            extracted_steps = extract_numbered_steps_from_text(response_text)
-            parsed['reasoning_steps'] = extracted_steps
-            logger.info(f"Extracted {len(extracted_steps)} steps via regex")
+        if not self._steps_done:
+            if self._steps_pos is None:
+                match = self._match_value(_STREAM_STEPS_KEY, _STREAM_STEPS_START_RE)
+                if match:
+                    self._steps_pos = match.end()
+                    if _STREAM_EMPTY_ARRAY_END_RE.match(self.buffer, self._steps_pos):
+                        self._steps_done = True
+            while self._steps_pos is not None and not self._steps_done:
+                match = _STREAM_STEP_ITEM_RE.match(self.buffer, self._steps_pos)
+                if not match:
+                    break
+                events.append(("reasoning_step", {
+                    "index": self.steps_emitted,
+                    "step": orjson.loads(match.group(1))
+                }))
+                self.steps_emitted += 1
+                self._steps_pos = match.end()
+                self._steps_done = match.group(2) == "]"
         
-        # Validate with Pydantic model
-        gemini_output = GeminiTriageOutput(**parsed)
-        logger.info("Successfully validated with Pydantic model")
-        return gemini_output
+        if self.recommended_action is None:
+            match = self._match_value(_STREAM_ACTION_KEY, _STREAM_ACTION_VALUE_RE)
+            if match:
+                self.recommended_action = orjson.loads(match.group(1))
+                events.append(("recommended_action", {"recommended_action": self.recommended_action}))
         
-    except (json.JSONDecodeError, ValidationError, KeyError) as e:
-        logger.error(f"Parse/validation error type: {type(e).__name__}")
-        logger.error(f"Parse/validation error: {str(e)}")
-        logger.error(f"Full raw response: {response_text}")
-        raise
+        return events
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+# Red-flag phrases that bypass the keyword short-circuit and the semantic cache;
+# urgency is always Gemini's call
+_RED_FLAG_WORDS_RE = re.compile(
+    r"\b(chest pain|stroke|unconscious|not breathing|severe bleeding|seizure)\b",
+    re.IGNORECASE
+)
+
+
+# Routine-care requests that may be triaged as Level 5 without calling Gemini.
+# Each must match the WHOLE normalized description (see _normalize_for_keyword_triage),
+# never just a phrase inside a longer description.
+LEVEL5_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"(prescription |medication |repeat )?refill",
+    r"(routine|annual) (checkup|check up|physical|visit|appointment)",
+    r"(vaccine|vaccination) appointment",
+    r"minor (cut|scrape|graze)",
+)]
+
+# Polite filler removed before the whole-description match
+_LEVEL5_FILLER_RE = re.compile(
+    r"\b(hi|hello|please|thanks|thank you|i|i'd|need|want|would|like|to|a|an|my|book|"
+    r"schedule|request|requesting|for|the|just)\b",
+    re.IGNORECASE
+)
+_NON_WORD_RE = re.compile(r"[^\w\s'-]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Any of these blocks the Level 5 short-circuit, deliberately broad: symptoms,
+# rescue/critical medicines, running out or using medication, overdose and
+# negations ("not a minor cut")
+_LEVEL5_BLOCKLIST_RE = re.compile(
+    r"\b(chest|breath\w*|bleed\w*|blood|unconscious|faint\w*|seiz\w*|stroke|numb\w*|"
+    r"weak\w*|confus\w*|dizz\w*|fever\w*|vomit\w*|severe|pain\w*|swell\w*|swollen|"
+    r"allerg\w*|pregnan\w*|infant|baby|newborn|suicid\w*|overdos\w*|too many|too much|"
+    r"head|burn\w*|deep|infect\w*|pus|ooz\w*|worse\w*|emergency|urgent|"
+    r"wheez\w*|palpitat\w*|racing|heart|thirst\w*|"
+    r"insulin|nitro\w*|epi-?pens?|epinephrine|adrenaline|inhalers?|"
+    r"ran out|run out|running out|out of|used|using|"
+    r"not|no|never|without|won't|can't|cannot|isn't|doesn't|\w+n't)\b",
+    re.IGNORECASE
+)
+
+
+def _normalize_for_keyword_triage(text_description: str) -> str:
+    """Lowercase, drop punctuation and polite filler, collapse whitespace."""
+    text = _NON_WORD_RE.sub(" ", text_description.lower())
+    text = _LEVEL5_FILLER_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def record_keyword_triage_decision(text_description: str, matched_rule: str, timestamp: str) -> None:
+    """
+    Record a short-circuit decision for clinician review.
+    Only a SHA-256 digest and the length of the description are kept, never
+    the raw symptom text. Entries go to the in-memory review queue and, when
+    KEYWORD_TRIAGE_AUDIT_PATH is set, are appended to that JSON-lines file.
+    """
+    entry = {
+        "timestamp": timestamp,
+        "description_sha256": hashlib.sha256(text_description.encode("utf-8")).hexdigest(),
+        "description_length": len(text_description),
+        "matched_rule": matched_rule
+    }
+    _KEYWORD_TRIAGE_REVIEW_QUEUE.append(entry)
+    if KEYWORD_TRIAGE_AUDIT_PATH:
+        try:
+            with open(KEYWORD_TRIAGE_AUDIT_PATH, "ab") as audit_file:
+                audit_file.write(orjson.dumps(entry) + b"\n")
+        except OSError as e:
+            logger.error("Failed to write keyword triage audit entry: %s", e)
+
+
+def keyword_triage(text_description: str) -> Optional[TriageResponse]:
+    """
+    Deterministic front-end for clearly routine requests (off by default).
+    Returns a Level 5 response only when the whole normalized description is a
+    LEVEL5_PATTERNS request, no red-flag or blocklisted term is present and the
+    description is short; otherwise None so the request falls through to
+    Gemini. Every short-circuit is recorded in the review queue so the rule
+    set can be audited.
+    """
+    if not KEYWORD_TRIAGE_ENABLED or len(text_description) >= KEYWORD_TRIAGE_MAX_CHARS:
+        return None
+    if _LEVEL5_BLOCKLIST_RE.search(text_description) or _RED_FLAG_WORDS_RE.search(text_description):
+        return None
+    
+    normalized = _normalize_for_keyword_triage(text_description)
+    match = next((m for m in (p.fullmatch(normalized) for p in LEVEL5_PATTERNS) if m), None)
+    if match is None:
+        return None
+    
+    result = TriageResponse(
+        urgency_level=5,
+        clinical_reasoning=(
+            "**RULE-BASED TRIAGE (NO AI ANALYSIS):**\n\n"
+            f"1. Matched routine-care rule: \"{match.group(0)}\"\n"
+            "2. No red-flag terms present in the description\n"
+            "\n**RED FLAGS IDENTIFIED:** None\n"
+            "\n**RECOMMENDED ACTION:** Schedule routine care. Re-triage if symptoms change or worsen.\n"
+        ),
+        uncertainty_score=0.2,
+        safety_flag=False,
+        dispatch_ambulance=False
+    )
+    record_keyword_triage_decision(text_description, match.re.pattern, result.timestamp)
+    logger.info("Keyword triage short-circuit to Level 5 (rule: %s) - queued for review", match.re.pattern)
+    return result
+
+
+def triage_cache_key(text_description: str, image_url: Optional[str] = None) -> str:
+    """Build the response cache key from the normalized symptom description."""
+    normalized = text_description.strip().lower()
+    if image_url:
+        normalized += "\x00" + image_url
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def is_safety_fallback(result: TriageResponse) -> bool:
+    """True if the response was produced by the safety fallback, not by Gemini."""
+    return result.clinical_reasoning.startswith(SAFETY_FALLBACK_HEADER)
 
 
-def trigger_mats_dispatch(patient_data: dict) -> None:
+async def embed_symptoms(text_description: str) -> np.ndarray:
+    """Embed a symptom description as an L2-normalized float32 vector."""
+    result = await genai.embed_content_async(
+        model=EMBEDDING_MODEL,
+        content=text_description.strip(),
+        task_type="semantic_similarity",
+        output_dimensionality=EMBEDDING_DIM
+    )
+    vector = np.asarray(result["embedding"], dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def semantic_cache_lookup(vector: np.ndarray) -> Optional[TriageResponse]:
+    """Return the cached response most similar to vector if above threshold."""
+    if _semantic_cache_size == 0:
+        return None
+    similarities = _SEMANTIC_CACHE_VECTORS[:_semantic_cache_size] @ vector
+    best = int(np.argmax(similarities))
+    if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+        return _SEMANTIC_CACHE_RESPONSES[best]
+    return None
+
+
+def semantic_cache_store(vector: np.ndarray, result: TriageResponse) -> None:
     """
-    Mock function for Uthishta MATS Ambulance Tracking System integration.
-    In production, this would connect to the actual MATS API.
+    Add a response to the semantic cache.
+    Only low-acuity (Level 3-5), unflagged results are stored: a paraphrase
+    match must never reuse a critical-case or safety-fallback decision.
+    """
+    global _SEMANTIC_CACHE_VECTORS, _semantic_cache_size, _semantic_cache_next
+    
+    if result.safety_flag or result.urgency_level < 3 or is_safety_fallback(result):
+        return
+    
+    if _SEMANTIC_CACHE_VECTORS is None:
+        _SEMANTIC_CACHE_VECTORS = np.zeros((SEMANTIC_CACHE_MAXSIZE, EMBEDDING_DIM), dtype=np.float32)
+        _SEMANTIC_CACHE_RESPONSES[:] = [None] * SEMANTIC_CACHE_MAXSIZE
+    
+    # Write in place, overwriting the oldest entry once full
+    _SEMANTIC_CACHE_VECTORS[_semantic_cache_next] = vector
+    _SEMANTIC_CACHE_RESPONSES[_semantic_cache_next] = result
+    _semantic_cache_next = (_semantic_cache_next + 1) % SEMANTIC_CACHE_MAXSIZE
+    _semantic_cache_size = min(_semantic_cache_size + 1, SEMANTIC_CACHE_MAXSIZE)
+
+
+def reset_semantic_cache() -> None:
+    """Drop all semantic cache entries and release the buffer."""
+    global _SEMANTIC_CACHE_VECTORS, _semantic_cache_size, _semantic_cache_next
+    _SEMANTIC_CACHE_VECTORS = None
+    _SEMANTIC_CACHE_RESPONSES.clear()
+    _semantic_cache_size = 0
+    _semantic_cache_next = 0
+
+
+async def trigger_mats_dispatch(patient_data: dict) -> None:
+    """
+    Uthishta MATS Ambulance Tracking System integration.
+    Runs as a background task (see dispatch_mats_in_background) so the MATS
+    round-trip never delays the triage response. Posts through the shared
+    app.state.http client. Without MATS_API_ENDPOINT and MATS_API_KEY
+    configured, the dispatch is only logged (mock mode).
     """
     logger.critical("=" * 80)
     logger.critical("🚨 INTEGRATION: Triggering Uthishta MATS Ambulance Tracking Protocol 🚨")
-    logger.critical(f"Patient Urgency: Level {patient_data.get('urgency_level')}")
-    logger.critical(f"Timestamp: {patient_data.get('timestamp')}")
-    logger.critical(f"Clinical Reasoning: {patient_data.get('clinical_reasoning')[:100]}...")
+    logger.critical("Patient Urgency: Level %s", patient_data.get('urgency_level'))
+    logger.critical("Timestamp: %s", patient_data.get('timestamp'))
+    logger.critical("Clinical Reasoning: %s...", patient_data.get('clinical_reasoning')[:100])
     logger.critical("=" * 80)
     
-    # TODO: Implement actual MATS API integration
-    # requests.post(MATS_API_ENDPOINT, json=patient_data)
+    if not (MATS_API_ENDPOINT and MATS_API_KEY):
+        return
+    
+    http = getattr(app.state, "http", None)
+    if http is None:
+        logger.error("MATS dispatch skipped - HTTP client not initialized; manual ambulance call required")
+        return
+    
+    try:
+        response = await http.post(
+            MATS_API_ENDPOINT,
+            json=patient_data,
+            headers={"Authorization": f"Bearer {MATS_API_KEY}"},
+            timeout=MATS_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        logger.critical("MATS dispatch acknowledged (HTTP %s)", response.status_code)
+    except Exception as e:
+        logger.error("MATS dispatch failed - manual ambulance call required: %s", e)
 
 
-def analyze_triage_with_gemini(symptoms: str, image_url: Optional[str] = None) -> TriageResponse:
+def dispatch_mats_in_background(patient_data: dict) -> None:
+    """Fire-and-forget MATS dispatch; the triage response is returned immediately."""
+    spawn_background_task(trigger_mats_dispatch(patient_data))
+
+
+def mats_dispatch_payload(result: TriageResponse, symptoms: str) -> dict:
+    """Build the MATS dispatch payload for a triage result."""
+    return {
+        "urgency_level": result.urgency_level,
+        "clinical_reasoning": result.clinical_reasoning,
+        "timestamp": result.timestamp,
+        "symptoms": symptoms
+    }
+
+
+def build_triage_response(gemini_output: GeminiTriageOutput) -> TriageResponse:
+    """Convert validated Gemini output into the API's TriageResponse."""
+    # Extract validated data from Pydantic model
+    urgency_level = gemini_output.urgency_level
+    uncertainty_score = gemini_output.uncertainty_score
+    reasoning_steps = gemini_output.reasoning_steps
+    red_flags = gemini_output.red_flags
+    recommended_action = gemini_output.recommended_action
+    
+    # Construct clinical reasoning trace (single join instead of repeated concatenation)
+    parts = ["**CHAIN-OF-THOUGHT ANALYSIS:**\n"]
+    parts.extend(f"{i}. {step}" for i, step in enumerate(reasoning_steps, 1))
+    parts.append(f"\n**RED FLAGS IDENTIFIED:** {', '.join(red_flags) if red_flags else 'None'}")
+    parts.append(f"\n**RECOMMENDED ACTION:** {recommended_action}\n")
+    clinical_reasoning = "\n".join(parts)
+    
+    # Determine safety flag (high uncertainty or critical symptoms)
+    safety_flag = (uncertainty_score > 0.7) or (urgency_level <= 2) or bool(red_flags)
+    
+    # Determine ambulance dispatch (only for Level 1)
+    dispatch_ambulance = (urgency_level == 1)
+    
+    return TriageResponse(
+        urgency_level=urgency_level,
+        clinical_reasoning=clinical_reasoning,
+        uncertainty_score=uncertainty_score,
+        safety_flag=safety_flag,
+        dispatch_ambulance=dispatch_ambulance
+    )
+
+
+def build_safety_fallback_response(symptoms: str, error: Exception) -> TriageResponse:
+    """SAFETY FALLBACK: Default to emergency with manual review."""
+    logger.error("Gemini API Error: %s", error)
+    logger.critical("SAFETY FALLBACK ACTIVATED - Defaulting to Level 1 Emergency")
+    
+    return TriageResponse(
+        urgency_level=1,
+        clinical_reasoning=(
+            f"{SAFETY_FALLBACK_HEADER}\n\n"
+            f"The AI triage system encountered an error: {str(error)}\n\n"
+            f"**SAFETY PROTOCOL:** Due to system limitations, this case has been "
+            f"automatically escalated to Level 1 (Emergency) and requires immediate "
+            f"manual review by qualified medical personnel.\n\n"
+            f"**Original Symptoms:** {symptoms}\n\n"
+            f"**Action Required:** Human clinician assessment MANDATORY."
+        ),
+        uncertainty_score=1.0,
+        safety_flag=True,
+        dispatch_ambulance=True  # Safety-first approach
+    )
+
+
+async def hedged_retry(prompt: str, failed_response_text: str) -> GeminiTriageOutput:
+    """
+    Retry an unparseable response with two concurrent Gemini calls:
+    (a) reformat the failed response as strict JSON
+    (b) regenerate from the original prompt
+    Both run with structured output. The first valid parse wins and the
+    other call is cancelled; raises if both return invalid output.
+    """
+    async def attempt(attempt_prompt: str) -> GeminiTriageOutput:
+        response = await GEMINI_MODEL.generate_content_async(attempt_prompt)
+        return parse_gemini_response(response.text)
+    
+    pending = {
+        asyncio.create_task(attempt(TRIAGE_REFORMAT_PROMPT.format(previous_response=failed_response_text))),
+        asyncio.create_task(attempt(prompt))
+    }
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    logger.info("Hedged retry succeeded")
+                    return task.result()
+                logger.warning("Hedged retry attempt failed: %s", task.exception())
+        raise RuntimeError("JSON parsing failed after hedged retry")
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def analyze_triage_with_gemini(symptoms: str, image_url: Optional[str] = None) -> TriageResponse:
     """
     Core reasoning engine using Gemini 2.5 Flash with Chain-of-Thought.
-    Includes robust error handling with retry logic and safety fallback.
     
-    Retry Strategy:
-    1. First attempt: Standard prompt
-    2. If JSON malformed: Ask Gemini to reformat as strict JSON
-    3. If still fails: Activate safety fallback (Level 1 + manual review)
+    Output is constrained to GEMINI_RESPONSE_SCHEMA (structured output), so a
+    single round-trip is normally made. If the response still fails
+    validation and HEDGE_ON_RETRY is set, hedged_retry races a reformat
+    request against a fresh generation. API errors or an invalid response
+    activate the safety fallback (Level 1 + manual review).
+    
+    The schema cannot bound urgency_level or uncertainty_score, so an
+    out-of-range value fails validation. With HEDGE_ON_RETRY off (the
+    default) that goes straight to the fallback, which dispatches MATS.
     """
     try:
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        if GEMINI_MODEL is None:
+            raise RuntimeError("Gemini model not configured (GEMINI_API_KEY not set)")
         
         # Prepare prompt
-        prompt = TRIAGE_SYSTEM_PROMPT.format(symptoms=symptoms)
+        prompt = TRIAGE_USER_PROMPT.format(symptoms=symptoms)
         
-        # Generate response (First attempt)
-        logger.info(f"Analyzing symptoms: {symptoms[:100]}...")
-        response = model.generate_content(prompt)
-        logger.info(f"Gemini response type: {type(response)}")
-        logger.info(f"Gemini response attributes: {dir(response)}")
-        logger.info(f"Gemini response.text type: {type(response.text)}")
-        logger.info(f"Gemini response.text (first 500 chars): {str(response.text)[:500]}")
+        # Generate response
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Symptoms (first 100 chars): %s", symptoms[:100])
+        response = await GEMINI_MODEL.generate_content_async(prompt)
         
+        # Parse response with Pydantic validation
         try:
-            # Parse response with Pydantic validation
             gemini_output = parse_gemini_response(response.text)
-            logger.info("First parse attempt succeeded")
-            
-        except Exception as parse_error:
-            # RETRY LOGIC: Ask Gemini to reformat as strict JSON
-            logger.warning(f"Initial parse failed ({type(parse_error).__name__}: {parse_error})")
-            logger.warning("Attempting retry with reformatting request...")
-            
-            retry_prompt = f"""The previous response was not in valid JSON format. 
-Please reformat the exact same medical analysis as strict JSON following this schema:
-
-{{
-  "reasoning_steps": ["Step 1: ...", "Step 2: ...", "Step 3: ...", "Step 4: ..."],
-  "urgency_level": <1-5>,
-  "uncertainty_score": <0.0-1.0>,
-  "red_flags": ["flag1", "flag2"],
-  "recommended_action": "brief action"
-}}
-
-Previous response to reformat:
-{response.text}
-"""
-            
-            retry_response = model.generate_content(retry_prompt)
-            
-            try:
-                # Second parse attempt
-                gemini_output = parse_gemini_response(retry_response.text)
-                logger.info("Retry successful - JSON reformatted correctly")
-                
-            except Exception as retry_parse_error:
-                # Both attempts failed - trigger safety fallback
-                logger.error(f"Retry parse also failed: {retry_parse_error}")
-                raise Exception("JSON parsing failed after retry")
-        
-        # Extract validated data from Pydantic model
-        urgency_level = gemini_output.urgency_level
-        uncertainty_score = gemini_output.uncertainty_score
-        reasoning_steps = gemini_output.reasoning_steps
-        red_flags = gemini_output.red_flags
-        recommended_action = gemini_output.recommended_action
+        except ValidationError:
+            if not HEDGE_ON_RETRY:
+                raise
+            logger.warning("Initial parse failed - starting hedged retry")
+            gemini_output = await hedged_retry(prompt, response.text)
         
-        # Construct clinical reasoning trace
-        clinical_reasoning = "**CHAIN-OF-THOUGHT ANALYSIS:**\n\n"
-        for i, step in enumerate(reasoning_steps, 1):
-            clinical_reasoning += f"{i}. {step}\n"
+        return build_triage_response(gemini_output)
         
-        clinical_reasoning += f"\n**RED FLAGS IDENTIFIED:** {', '.join(red_flags) if red_flags else 'None'}\n"
-        clinical_reasoning += f"\n**RECOMMENDED ACTION:** {recommended_action}\n"
-        
-        # Determine safety flag (high uncertainty or critical symptoms)
-        safety_flag = (uncertainty_score > 0.7) or (urgency_level <= 2) or bool(red_flags)
+    except Exception as e:
+        # SAFETY FALLBACK: Default to emergency with manual review
+        return build_safety_fallback_response(symptoms, e)
+
+
+async def lookup_cached_triage(
+    text_description: str,
+    image_url: Optional[str] = None
+) -> Tuple[Optional[TriageResponse], str, Optional[np.ndarray]]:
+    """
+    Resolve a triage result without calling Gemini, shared by /triage,
+    /triage/stream and the batch queue.
+    
+    Lookup order:
+    1. Keyword short-circuit for clearly routine (Level 5) requests
+    2. Exact-match cache (normalized description)
+    3. Semantic cache (paraphrases), if SEMANTIC_CACHE_ENABLED
+    
+    Returns (result or None, cache key, embedding or None); on a miss pass
+    the key and embedding to store_triage_result after the Gemini analysis.
+    """
+    cache_key = triage_cache_key(text_description, image_url)
+    if not image_url:
+        routine = keyword_triage(text_description)
+        if routine is not None:
+            return routine, cache_key, None
+    
+    # Lookup and store run without an await in between, so no lock is needed
+    cached = _RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        _RESPONSE_CACHE_STATS["hits"] += 1
+        logger.info("Response cache hit")
+        return cached.model_copy(update={"timestamp": utc_timestamp()}), cache_key, None
+    _RESPONSE_CACHE_STATS["misses"] += 1
+    
+    # Emergencies and blocklisted descriptions never reuse a paraphrase's
+    # answer, so skip the embedding call for them entirely
+    vector = None
+    if (
+        SEMANTIC_CACHE_ENABLED
+        and not image_url
+        and not _RED_FLAG_WORDS_RE.search(text_description)
+        and not _LEVEL5_BLOCKLIST_RE.search(text_description)
+    ):
+        try:
+            vector = await embed_symptoms(text_description)
+        except Exception as e:
+            logger.warning("Embedding failed, skipping semantic cache: %s", e)
+    
+    if vector is not None:
+        similar = semantic_cache_lookup(vector)
+        _SEMANTIC_CACHE_STATS["hits" if similar is not None else "misses"] += 1
+        total = _SEMANTIC_CACHE_STATS["hits"] + _SEMANTIC_CACHE_STATS["misses"]
+        logger.info(
+            "Semantic cache %s (hit rate %.1f%%)",
+            "hit" if similar is not None else "miss",
+            100 * _SEMANTIC_CACHE_STATS["hits"] / total
+        )
+        if similar is not None:
+            return similar.model_copy(update={"timestamp": utc_timestamp()}), cache_key, vector
+    
+    return None, cache_key, vector
+
+
+def store_triage_result(cache_key: str, vector: Optional[np.ndarray], result: TriageResponse) -> None:
+    """Cache a Gemini result in the exact and semantic caches."""
+    # Never cache safety fallbacks - they would mask recovery of the API
+    if is_safety_fallback(result):
+        return
+    _RESPONSE_CACHE[cache_key] = result
+    if vector is not None:
+        semantic_cache_store(vector, result)
+
+
+async def get_triage_result(text_description: str, image_url: Optional[str] = None) -> TriageResponse:
+    """Resolve a triage result through the response caches before calling Gemini."""
+    cached, cache_key, vector = await lookup_cached_triage(text_description, image_url)
+    if cached is not None:
+        return cached
+    
+    # Perform AI-powered triage analysis
+    result = await analyze_triage_with_gemini(symptoms=text_description, image_url=image_url)
+    store_triage_result(cache_key, vector, result)
+    
+    return result
+
+
+async def stream_triage_events(text_description: str, image_url: Optional[str] = None):
+    """
+    Stream a triage analysis as server-sent events.
+    
+    Events:
+    - reasoning_step: one per completed step
+    - recommended_action: once the field closes
+    - urgency_level: once the field closes
+    - result: the final validated TriageResponse (or the safety fallback)
+    
+    Field events arrive in the order Gemini writes the fields. The SDK's
+    Schema cannot set a property order, and Gemini then returns properties
+    alphabetically, so urgency_level arrives just before result. MATS
+    dispatch therefore waits for the validated result and its full trace.
+    """
+    cached, cache_key, vector = await lookup_cached_triage(text_description, image_url)
+    if cached is not None:
+        if cached.dispatch_ambulance:
+            dispatch_mats_in_background(mats_dispatch_payload(cached, text_description))
+        yield format_sse("result", cached.model_dump())
+        return
+    
+    parser = StreamingTriageParser()
+    try:
+        if GEMINI_MODEL is None:
+            raise RuntimeError("Gemini model not configured (GEMINI_API_KEY not set)")
+        prompt = TRIAGE_USER_PROMPT.format(symptoms=text_description)
+        response = await GEMINI_MODEL.generate_content_async(prompt, stream=True)
         
-        # Determine ambulance dispatch (only for Level 1)
-        dispatch_ambulance = (urgency_level == 1)
+        async for chunk in response:
+            for event, data in parser.feed(chunk.text):
+                yield format_sse(event, data)
         
-        return TriageResponse(
-            urgency_level=urgency_level,
-            clinical_reasoning=clinical_reasoning,
-            uncertainty_score=uncertainty_score,
-            safety_flag=safety_flag,
-            dispatch_ambulance=dispatch_ambulance
-        )
+        result = build_triage_response(parse_gemini_response(parser.buffer))
+        store_triage_result(cache_key, vector, result)
         
     except Exception as e:
-        # SAFETY FALLBACK: Default to emergency with manual review
-        logger.error(f"Gemini API Error: {str(e)}")
-        logger.critical("SAFETY FALLBACK ACTIVATED - Defaulting to Level 1 Emergency")
-        
-        return TriageResponse(
-            urgency_level=1,
-            clinical_reasoning=(
-                f"**SYSTEM ERROR - SAFETY FALLBACK ACTIVATED**\n\n"
-                f"The AI triage system encountered an error: {str(e)}\n\n"
-                f"**SAFETY PROTOCOL:** Due to system limitations, this case has been "
-                f"automatically escalated to Level 1 (Emergency) and requires immediate "
-                f"manual review by qualified medical personnel.\n\n"
-                f"**Original Symptoms:** {symptoms}\n\n"
-                f"**Action Required:** Human clinician assessment MANDATORY."
-            ),
-            uncertainty_score=1.0,
-            safety_flag=True,
-            dispatch_ambulance=True  # Safety-first approach
+        result = build_safety_fallback_response(text_description, e)
+    
+    if result.dispatch_ambulance:
+        dispatch_mats_in_background(mats_dispatch_payload(result, text_description))
+    
+    logger.info("Streaming triage completed: Level %d, Uncertainty: %.2f", result.urgency_level, result.uncertainty_score)
+    yield format_sse("result", result.model_dump())
+
+
+def spawn_background_task(coro) -> asyncio.Task:
+    """Schedule a fire-and-forget task, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+    return task
+
+
+def enqueue_batch_job(text_description: str, image_url: Optional[str] = None) -> BatchJobStatus:
+    """
+    Queue a batch-priority triage request.
+    The queue is flushed when it reaches BATCH_MAX_SIZE entries or
+    BATCH_MAX_WAIT_SECONDS after the first queued entry, whichever is first.
+    """
+    global _batch_flush_timer
+    
+    job = BatchJobStatus(job_id=str(uuid.uuid4()), status="queued")
+    _BATCH_JOBS[job.job_id] = job
+    _BATCH_QUEUE.append((job.job_id, text_description, image_url))
+    
+    if len(_BATCH_QUEUE) >= BATCH_MAX_SIZE:
+        spawn_background_task(flush_batch_queue())
+    elif _batch_flush_timer is None or _batch_flush_timer.done():
+        _batch_flush_timer = spawn_background_task(_flush_batch_queue_after_delay())
+    
+    return job
+
+
+async def _flush_batch_queue_after_delay() -> None:
+    # The flush runs as its own task so cancelling the timer never interrupts it
+    await asyncio.sleep(BATCH_MAX_WAIT_SECONDS)
+    spawn_background_task(flush_batch_queue())
+
+
+async def flush_batch_queue() -> None:
+    """
+    Run all queued batch jobs with bounded concurrency and store the results.
+    Jobs use the realtime Gemini model (no Batch API discount). They are
+    retrospective (intake review, audit), so they never trigger MATS
+    dispatch: results carry dispatched=False and Level 1 results are
+    logged for follow-up instead.
+    """
+    jobs = _BATCH_QUEUE[:]
+    _BATCH_QUEUE.clear()
+    if not jobs:
+        return
+    
+    logger.info("Flushing batch queue: %d jobs", len(jobs))
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def run_job(job_id: str, text_description: str, image_url: Optional[str]) -> None:
+        async with semaphore:
+            _BATCH_JOBS[job_id] = BatchJobStatus(job_id=job_id, status="running")
+            result = await get_triage_result(text_description, image_url)
+            _BATCH_JOBS[job_id] = BatchJobStatus(job_id=job_id, status="completed", result=result)
+            if result.dispatch_ambulance:
+                logger.warning("Batch job %s assessed as Level 1 - manual follow-up required", job_id)
+    
+    await asyncio.gather(*(run_job(*job) for job in jobs))
+
+
+def validate_symptom_description(text_description: str) -> None:
+    """Reject descriptions too short to triage."""
+    if not text_description or len(text_description.strip()) < 5:
+        raise HTTPException(
+            status_code=400,
+            detail="Symptom description too short. Please provide detailed symptoms."
         )
 
 
+# Health check body never changes after startup: encode it once and serve
+# it with an ETag so load-balancer probes can be answered with 304.
+_HEALTH_BODY = orjson.dumps({
+    "status": "operational",
+    "service": "TriageFlow API",
+    "version": "1.0.0",
+    "gemini_configured": bool(GEMINI_API_KEY)
+})
+_HEALTH_HEADERS = {
+    "ETag": f'"{hashlib.md5(_HEALTH_BODY, usedforsecurity=False).hexdigest()}"',
+    "Cache-Control": "max-age=5"
+}
+
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Health check endpoint."""
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or _HEALTH_HEADERS["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=_HEALTH_HEADERS)
+    return Response(content=_HEALTH_BODY, media_type="application/json", headers=_HEALTH_HEADERS)
+
+
+@app.get("/triage/review-queue")
+async def get_keyword_triage_review_queue():
+    """Recent keyword short-circuit decisions (hashed, no symptom text), for clinician audit of the rule set."""
+    return list(_KEYWORD_TRIAGE_REVIEW_QUEUE)
+
+
+@app.get("/stats")
+async def stats():
+    """Response cache statistics."""
     return {
-        "status": "operational",
-        "service": "TriageFlow API",
-        "version": "1.0.0",
-        "gemini_configured": bool(GEMINI_API_KEY)
+        "response_cache": {
+            **_RESPONSE_CACHE_STATS,
+            "size": len(_RESPONSE_CACHE)
+        },
+        "semantic_cache": {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            **_SEMANTIC_CACHE_STATS,
+            "size": _semantic_cache_size
+        }
     }
 
 
-@app.post("/triage", response_model=TriageResponse)
+@app.post("/triage", response_model=TriageResponse, responses={202: {"model": BatchJobStatus}})
 async def perform_triage(request: TriageRequest):
     """
     Main triage endpoint with Gemini-powered reasoning engine.
@@ -318,43 +1014,69 @@ async def perform_triage(request: TriageRequest):
     - Uncertainty quantification
     - Automatic fallback to emergency for system errors
     - MATS ambulance dispatch for Level 1 urgencies
+    
+    Requests with `priority="batch"` are queued and answered with
+    202 Accepted and a job ID; poll `/triage/jobs/{job_id}` for the result.
     """
     try:
-        logger.info(f"Received triage request: {len(request.text_description)} chars")
+        logger.info("Received triage request: %d chars", len(request.text_description))
         
-        # Validate input
-        if not request.text_description or len(request.text_description.strip()) < 5:
-            raise HTTPException(
-                status_code=400,
-                detail="Symptom description too short. Please provide detailed symptoms."
-            )
+        validate_symptom_description(request.text_description)
         
-        # Perform AI-powered triage analysis
-        result = analyze_triage_with_gemini(
-            symptoms=request.text_description,
-            image_url=request.image_url
-        )
+        if request.priority == "batch":
+            job = enqueue_batch_job(request.text_description, request.image_url)
+            logger.info("Queued batch triage job %s", job.job_id)
+            return JSONResponse(status_code=202, content=job.model_dump())
+        
+        result = await get_triage_result(request.text_description, request.image_url)
         
         # Trigger ambulance dispatch if needed
         if result.dispatch_ambulance:
-            trigger_mats_dispatch({
-                "urgency_level": result.urgency_level,
-                "clinical_reasoning": result.clinical_reasoning,
-                "timestamp": result.timestamp,
-                "symptoms": request.text_description
-            })
+            dispatch_mats_in_background(mats_dispatch_payload(result, request.text_description))
         
-        logger.info(f"Triage completed: Level {result.urgency_level}, Uncertainty: {result.uncertainty_score:.2f}")
+        logger.info("Triage completed: Level %d, Uncertainty: %.2f", result.urgency_level, result.uncertainty_score)
         
         return result
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in triage endpoint: {str(e)}")
+        logger.error("Unexpected error in triage endpoint: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.post("/triage/stream")
+async def perform_triage_stream(request: TriageRequest):
+    """
+    Streaming variant of /triage using server-sent events.
+    Emits urgency level and reasoning steps as Gemini generates them, then
+    a final `result` event with the same payload /triage returns.
+    Batch priority cannot be streamed; use POST /triage for batch jobs.
+    """
+    logger.info("Received streaming triage request: %d chars", len(request.text_description))
+    validate_symptom_description(request.text_description)
+    if request.priority == "batch":
+        raise HTTPException(
+            status_code=400,
+            detail="priority='batch' is not supported for streaming; use POST /triage"
+        )
+    
+    return StreamingResponse(
+        stream_triage_events(request.text_description, request.image_url),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/triage/jobs/{job_id}", response_model=BatchJobStatus)
+async def get_batch_job(job_id: str):
+    """Poll the status and result of a batch-priority triage job."""
+    job = _BATCH_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found or expired")
+    return job
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,6 +1,9 @@
 import sys
 import os
-from unittest.mock import MagicMock
+import asyncio
+import hashlib
+import json
+from unittest.mock import AsyncMock, MagicMock
 
 # Add backend directory to sys.path so we can import app
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -10,7 +13,8 @@ mock_genai = MagicMock()
 sys.modules["google.generativeai"] = mock_genai
 
 from fastapi.testclient import TestClient
-from app.main import app, analyze_triage_with_gemini
+from app.main import app, analyze_triage_with_gemini, StreamingTriageParser
+import app.main as main
 
 client = TestClient(app)
 
@@ -19,21 +23,30 @@ def test_read_root():
     assert response.status_code == 200
     assert response.json()["status"] == "operational"
 
+def test_read_root_etag():
+    etag = client.get("/").headers["etag"]
+
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
 def test_triage_validation_error():
     response = client.post("/triage", json={"text_description": "bad"})
     # The validation logic in perform_triage: len(request.text_description.strip()) < 5
     assert response.status_code == 400
     assert "Symptom description too short" in response.json()["detail"]
 
-def test_triage_gemini_mock_success():
+def test_triage_gemini_mock_success(monkeypatch):
     # Setup mock response
     mock_model = MagicMock()
-    mock_genai.GenerativeModel.return_value = mock_model
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
 
     mock_response = MagicMock()
     # Mock a valid JSON response from Gemini
     mock_response.text = """
-    ```json
     {
         "reasoning_steps": ["Step 1: Test", "Step 2: Analysis"],
         "urgency_level": 3,
@@ -41,9 +54,8 @@ def test_triage_gemini_mock_success():
         "red_flags": [],
         "recommended_action": "Monitor"
     }
-    ```
     """
-    mock_model.generate_content.return_value = mock_response
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
 
     response = client.post("/triage", json={"text_description": "Patient has a headache for 2 days."})
 
@@ -53,14 +65,14 @@ def test_triage_gemini_mock_success():
     assert data["dispatch_ambulance"] is False
     assert "Step 1: Test" in data["clinical_reasoning"]
 
-    # Verify the correct model was initialized
-    mock_genai.GenerativeModel.assert_called_with('gemini-1.5-flash')
+    prompt = mock_model.generate_content_async.call_args.args[0]
+    assert prompt.startswith("**INPUT:** Patient describes: Patient has a headache")
 
-def test_triage_gemini_fallback():
+def test_triage_gemini_fallback(monkeypatch):
     # Setup mock to raise exception
     mock_model = MagicMock()
-    mock_genai.GenerativeModel.return_value = mock_model
-    mock_model.generate_content.side_effect = Exception("API Error")
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_model.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
 
     response = client.post("/triage", json={"text_description": "Serious condition"})
 
@@ -71,59 +83,544 @@ def test_triage_gemini_fallback():
     assert data["dispatch_ambulance"] is True
     assert "SAFETY FALLBACK ACTIVATED" in data["clinical_reasoning"]
 
-def test_json_regex_flexibility():
-    # Test different JSON formats response from Gemini
-
-    # 1. No language tag
+def test_analyze_plain_json_response(monkeypatch):
     mock_model = MagicMock()
-    mock_genai.GenerativeModel.return_value = mock_model
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
     mock_response = MagicMock()
     mock_response.text = """
-    ```
     {
         "reasoning_steps": ["Step 1"],
-        "urgency_level": 5,
+        "urgency_level": 2,
         "uncertainty_score": 0.1,
         "red_flags": [],
         "recommended_action": "Rest"
     }
-    ```
     """
-    mock_model.generate_content.return_value = mock_response
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
 
     # We call analyze_triage_with_gemini directly to avoid client overhead for this unit test
-    result = analyze_triage_with_gemini("symptoms")
-    assert result.urgency_level == 5
+    result = asyncio.run(analyze_triage_with_gemini("symptoms"))
+    assert result.urgency_level == 2
+
+
+def test_invalid_response_triggers_safety_fallback(monkeypatch):
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
 
-    # 2. JSON caps
+    bad_response = MagicMock()
+    bad_response.text = "Urgency is probably level 3, not sure."
+    mock_model.generate_content_async = AsyncMock(return_value=bad_response)
+
+    result = asyncio.run(analyze_triage_with_gemini("symptoms"))
+    assert result.urgency_level == 1
+    assert result.dispatch_ambulance is True
+    assert main.is_safety_fallback(result)
+    # No reformatting retry - a single round-trip
+    assert mock_model.generate_content_async.await_count == 1
+
+
+def test_triage_response_cache(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
     mock_response.text = """
-    ```JSON
     {
-        "reasoning_steps": ["Step 1"],
+        "reasoning_steps": ["Step 1: Cached"],
         "urgency_level": 4,
-        "uncertainty_score": 0.1,
+        "uncertainty_score": 0.2,
         "red_flags": [],
         "recommended_action": "Rest"
     }
-    ```
     """
-    result = analyze_triage_with_gemini("symptoms")
-    assert result.urgency_level == 4
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
 
-    # 3. No code blocks (just JSON) - This might fail if the code strictly expects code blocks?
-    # backend code says:
-    # json_match = re.search(...)
-    # if json_match: ...
-    # else: parsed = json.loads(response_text)
+    first = client.post("/triage", json={"text_description": "Mild sore throat since yesterday"})
+    second = client.post("/triage", json={"text_description": "  mild sore throat since YESTERDAY "})
 
-    mock_response.text = """
+    assert first.status_code == second.status_code == 200
+    assert second.json()["urgency_level"] == 4
+    assert mock_model.generate_content_async.await_count == 1
+    assert client.get("/stats").json()["response_cache"]["hits"] >= 1
+
+
+def test_triage_fallback_not_cached(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_model.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
+
+    client.post("/triage", json={"text_description": "Persistent cough for a week"})
+    client.post("/triage", json={"text_description": "Persistent cough for a week"})
+
+    assert len(main._RESPONSE_CACHE) == 0
+    assert mock_model.generate_content_async.await_count == 2
+
+
+def _gemini_json(urgency_level, red_flags="[]"):
+    return """
     {
-        "reasoning_steps": ["Step 1"],
-        "urgency_level": 2,
-        "uncertainty_score": 0.1,
-        "red_flags": [],
-        "recommended_action": "Rest"
+        "reasoning_steps": ["Step 1: Assess"],
+        "urgency_level": %d,
+        "uncertainty_score": 0.2,
+        "red_flags": %s,
+        "recommended_action": "Follow up"
     }
-    """
-    result = analyze_triage_with_gemini("symptoms")
-    assert result.urgency_level == 2
+    """ % (urgency_level, red_flags)
+
+
+def test_semantic_cache_reuses_low_acuity_only(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    monkeypatch.setattr(main, "SEMANTIC_CACHE_ENABLED", True)
+    main.reset_semantic_cache()
+    mock_genai.embed_content_async = AsyncMock(return_value={"embedding": [1.0] * main.EMBEDDING_DIM})
+
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
+
+    # Level 4 result is reused for a paraphrase
+    mock_response.text = _gemini_json(4)
+    client.post("/triage", json={"text_description": "Itchy rash on arm for 3 days"})
+    response = client.post("/triage", json={"text_description": "3-day itchy arm rash"})
+    assert response.json()["urgency_level"] == 4
+    assert mock_model.generate_content_async.await_count == 1
+
+    # Red-flag descriptions skip the semantic cache and the embedding call
+    main._RESPONSE_CACHE.clear()
+    main.reset_semantic_cache()
+    embed_calls = mock_genai.embed_content_async.await_count
+    mock_response.text = _gemini_json(2, '["chest pain"]')
+    client.post("/triage", json={"text_description": "Chest pain for 2 hours"})
+    client.post("/triage", json={"text_description": "2-hour chest pain"})
+    assert mock_model.generate_content_async.await_count == 3
+    assert mock_genai.embed_content_async.await_count == embed_calls
+
+    # Level 2 result is never stored, so a paraphrase goes back to Gemini
+    main._RESPONSE_CACHE.clear()
+    client.post("/triage", json={"text_description": "Sudden hearing loss in one ear"})
+    client.post("/triage", json={"text_description": "Lost hearing suddenly in one ear"})
+    assert mock_model.generate_content_async.await_count == 5
+
+
+def test_semantic_cache_ring_buffer_evicts_oldest(monkeypatch):
+    monkeypatch.setattr(main, "SEMANTIC_CACHE_MAXSIZE", 2)
+    main.reset_semantic_cache()
+    assert main._SEMANTIC_CACHE_VECTORS is None
+    vectors = main.np.eye(3, main.EMBEDDING_DIM, dtype=main.np.float32)
+    responses = [
+        main.TriageResponse(urgency_level=level, clinical_reasoning="r", uncertainty_score=0.1,
+                            safety_flag=False, dispatch_ambulance=False)
+        for level in (3, 4, 5)
+    ]
+    for vector, response in zip(vectors, responses):
+        main.semantic_cache_store(vector, response)
+    assert main._SEMANTIC_CACHE_VECTORS.shape == (2, main.EMBEDDING_DIM)
+
+    # Oldest (Level 3) entry was overwritten in place by the third store
+    assert main._semantic_cache_size == 2
+    assert main.semantic_cache_lookup(vectors[0]) is None
+    assert main.semantic_cache_lookup(vectors[2]).urgency_level == 5
+    main.reset_semantic_cache()
+
+
+class _FakeStream:
+    """Async-iterable stand-in for a streamed Gemini response."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for text in self._chunks:
+            chunk = MagicMock()
+            chunk.text = text
+            yield chunk
+
+
+def test_streaming_parser_emits_fields_as_they_close():
+    parser = StreamingTriageParser()
+    assert parser.feed('{"urgency_level": ') == []
+    assert parser.feed('1, "reasoning_steps": ["Airway \\"compromised\\"", "Cal') == [
+        ("urgency_level", {"urgency_level": 1}),
+        ("reasoning_step", {"index": 0, "step": 'Airway "compromised"'}),
+    ]
+    assert parser.feed('l EMS"], "recommended_action": "Dispatch"}') == [
+        ("reasoning_step", {"index": 1, "step": "Call EMS"}),
+        ("recommended_action", {"recommended_action": "Dispatch"}),
+    ]
+
+
+def test_streaming_parser_finds_keys_split_across_chunks():
+    parser = StreamingTriageParser()
+    assert parser.feed('{"reasoning_st') == []
+    assert parser.feed('eps": ["Assess"], "recommended_action": "Rest", "urgency_le') == [
+        ("reasoning_step", {"index": 0, "step": "Assess"}),
+        ("recommended_action", {"recommended_action": "Rest"}),
+    ]
+    assert parser.feed('vel": 4}') == [("urgency_level", {"urgency_level": 4})]
+
+
+def test_triage_stream_endpoint(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    dispatches = []
+    monkeypatch.setattr(main, "dispatch_mats_in_background", dispatches.append)
+
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    # Gemini returns schema properties in alphabetical order
+    mock_model.generate_content_async = AsyncMock(return_value=_FakeStream([
+        '{"reasoning_steps": ["Unresponsive"',
+        '], "recommended_action": "Dispatch ambulance", "red_flags": ["unconscious"], ',
+        '"uncertainty_score": 0.1, "urg',
+        'ency_level": 1}',
+    ]))
+
+    response = client.post(
+        "/triage/stream",
+        json={"text_description": "Found unconscious on the floor"},
+        headers={"accept-encoding": "gzip"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    # SSE must never be gzipped, or events are buffered by the compressor
+    assert "content-encoding" not in response.headers
+    events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events == ["reasoning_step", "recommended_action", "urgency_level", "result"]
+    # Dispatched once, with the validated result's full reasoning trace
+    assert len(dispatches) == 1
+    assert "Unresponsive" in dispatches[0]["clinical_reasoning"]
+    assert mock_model.generate_content_async.call_args.kwargs["stream"] is True
+
+
+def test_batch_priority_queues_job(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
+    mock_response.text = _gemini_json(5)
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
+
+    response = client.post("/triage", json={
+        "text_description": "Annual review of chronic knee stiffness",
+        "priority": "batch"
+    })
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert client.get(f"/triage/jobs/{job_id}").json()["status"] == "queued"
+
+    asyncio.run(main.flush_batch_queue())
+
+    job = client.get(f"/triage/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["result"]["urgency_level"] == 5
+    assert job["dispatched"] is False
+    assert client.get("/triage/jobs/unknown").status_code == 404
+
+
+def test_batch_level1_job_is_never_dispatched(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    dispatches = []
+    monkeypatch.setattr(main, "dispatch_mats_in_background", dispatches.append)
+    monkeypatch.setattr(main, "_BATCH_QUEUE", [])
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
+    mock_response.text = _gemini_json(1, '["unconscious"]')
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
+
+    monkeypatch.setattr(main, "_batch_flush_timer", None)
+
+    async def enqueue_and_flush():
+        job = main.enqueue_batch_job("Retrospective review: found unconscious last week")
+        await main.flush_batch_queue()
+        return main._BATCH_JOBS[job.job_id]
+
+    job = asyncio.run(enqueue_and_flush())
+    assert job.result.dispatch_ambulance is True
+    assert job.dispatched is False
+    assert dispatches == []
+
+
+def test_triage_stream_rejects_batch_priority():
+    response = client.post(
+        "/triage/stream",
+        json={"text_description": "Annual review of chronic knee stiffness", "priority": "batch"}
+    )
+    assert response.status_code == 400
+
+
+def test_triage_stream_shares_semantic_cache(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    monkeypatch.setattr(main, "SEMANTIC_CACHE_ENABLED", True)
+    main.reset_semantic_cache()
+    mock_genai.embed_content_async = AsyncMock(return_value={"embedding": [1.0] * main.EMBEDDING_DIM})
+
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
+    mock_response.text = _gemini_json(4)
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
+
+    client.post("/triage", json={"text_description": "Itchy rash on arm for 3 days"})
+    response = client.post("/triage/stream", json={"text_description": "3-day itchy arm rash"})
+
+    events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events == ["result"]
+    assert '"urgency_level":4' in response.text
+    assert mock_model.generate_content_async.await_count == 1
+
+
+def test_batch_queue_flushes_on_timer(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    monkeypatch.setattr(main, "BATCH_MAX_WAIT_SECONDS", 0)
+    monkeypatch.setattr(main, "_BATCH_QUEUE", [])
+    monkeypatch.setattr(main, "_batch_flush_timer", None)
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
+    mock_response.text = _gemini_json(5)
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
+
+    async def enqueue_and_wait():
+        job = main.enqueue_batch_job("Annual review of chronic hip stiffness")
+        await asyncio.sleep(0.05)
+        return main._BATCH_JOBS[job.job_id]
+
+    job = asyncio.run(enqueue_and_wait())
+    assert job.status == "completed"
+    assert job.result.urgency_level == 5
+
+
+def test_batch_queue_flushes_on_shutdown(monkeypatch):
+    main._RESPONSE_CACHE.clear()
+    monkeypatch.setattr(main, "_BATCH_QUEUE", [])
+    monkeypatch.setattr(main, "_batch_flush_timer", None)
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_response = MagicMock()
+    mock_response.text = _gemini_json(5)
+    mock_model.generate_content_async = AsyncMock(return_value=mock_response)
+
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.post("/triage", json={
+            "text_description": "Annual review of chronic shoulder stiffness",
+            "priority": "batch"
+        })
+        job_id = response.json()["job_id"]
+        assert lifespan_client.get(f"/triage/jobs/{job_id}").json()["status"] == "queued"
+
+    # The 60s timer was cancelled and the queue flushed during shutdown
+    assert main._BATCH_JOBS[job_id].status == "completed"
+
+
+def test_build_triage_model_requests_structured_output():
+    main.build_triage_model()
+
+    mock_genai.GenerativeModel.assert_called_with(
+        main.GEMINI_MODEL_NAME,
+        system_instruction=main.TRIAGE_SYSTEM_INSTRUCTION,
+        generation_config=main.STRUCTURED_OUTPUT_CONFIG
+    )
+    assert main.STRUCTURED_OUTPUT_CONFIG["response_mime_type"] == "application/json"
+    assert main.STRUCTURED_OUTPUT_CONFIG["response_schema"] is main.GEMINI_RESPONSE_SCHEMA
+
+
+def test_missing_model_triggers_safety_fallback(monkeypatch):
+    monkeypatch.setattr(main, "GEMINI_MODEL", None)
+
+    result = asyncio.run(analyze_triage_with_gemini("symptoms"))
+
+    assert main.is_safety_fallback(result)
+
+
+def test_cors_preflight_allows_frontend_origin():
+    response = client.options("/triage", headers={
+        "Origin": "http://localhost:3000",
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "content-type",
+    })
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert response.headers["access-control-max-age"] == "86400"
+
+    response = client.options("/triage", headers={
+        "Origin": "http://evil.example",
+        "Access-Control-Request-Method": "POST",
+    })
+    assert response.status_code == 400
+
+
+def test_trigger_mats_dispatch_posts_when_configured(monkeypatch):
+    http_client = MagicMock()
+    http_client.post = AsyncMock(return_value=MagicMock(status_code=202))
+    monkeypatch.setattr(main.app.state, "http", http_client, raising=False)
+    monkeypatch.setattr(main, "MATS_API_ENDPOINT", "https://mats.example/dispatch")
+    monkeypatch.setattr(main, "MATS_API_KEY", "test-key")
+    payload = {"urgency_level": 1, "clinical_reasoning": "Unresponsive", "timestamp": "now", "symptoms": "x"}
+
+    asyncio.run(main.trigger_mats_dispatch(payload))
+
+    http_client.post.assert_awaited_once()
+    assert http_client.post.call_args.kwargs["json"] == payload
+
+    # Errors are logged inside the task, never raised to the caller
+    http_client.post = AsyncMock(side_effect=Exception("MATS down"))
+    asyncio.run(main.trigger_mats_dispatch(payload))
+
+
+def test_triage_response_is_frozen_with_utc_timestamp():
+    result = main.TriageResponse(
+        urgency_level=4,
+        clinical_reasoning="Mild symptoms",
+        uncertainty_score=0.2,
+        safety_flag=False,
+        dispatch_ambulance=False
+    )
+    assert result.timestamp.endswith("+00:00")
+    try:
+        result.urgency_level = 1
+    except main.ValidationError:
+        pass
+    else:
+        raise AssertionError("TriageResponse should be immutable")
+
+
+def test_build_triage_response_reasoning_trace():
+    result = main.build_triage_response(main.GeminiTriageOutput(
+        reasoning_steps=["Fever noted", "No neck stiffness"],
+        urgency_level=3,
+        uncertainty_score=0.3,
+        red_flags=["fever"],
+        recommended_action="See clinician today"
+    ))
+    assert result.clinical_reasoning == (
+        "**CHAIN-OF-THOUGHT ANALYSIS:**\n\n"
+        "1. Fever noted\n"
+        "2. No neck stiffness\n"
+        "\n**RED FLAGS IDENTIFIED:** fever\n"
+        "\n**RECOMMENDED ACTION:** See clinician today\n"
+    )
+    assert result.safety_flag is True
+    assert result.dispatch_ambulance is False
+
+
+def test_keyword_triage_disabled_by_default():
+    assert main.KEYWORD_TRIAGE_ENABLED is False
+    assert main.keyword_triage("Routine checkup please") is None
+
+
+def test_keyword_triage_short_circuits_routine_requests(monkeypatch):
+    monkeypatch.setattr(main, "KEYWORD_TRIAGE_ENABLED", True)
+    main._KEYWORD_TRIAGE_REVIEW_QUEUE.clear()
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    mock_model.generate_content_async = AsyncMock(side_effect=AssertionError("Gemini should not be called"))
+
+    response = client.post("/triage", json={"text_description": "Need a prescription refill please"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["urgency_level"] == 5
+    assert data["safety_flag"] is False
+    assert data["dispatch_ambulance"] is False
+    queue = client.get("/triage/review-queue").json()
+    assert len(queue) == 1
+    assert "text_description" not in queue[0]
+    assert queue[0]["description_length"] == len("Need a prescription refill please")
+
+
+def test_keyword_triage_audit_file_has_no_symptom_text(monkeypatch, tmp_path):
+    audit_path = tmp_path / "keyword_audit.jsonl"
+    monkeypatch.setattr(main, "KEYWORD_TRIAGE_ENABLED", True)
+    monkeypatch.setattr(main, "KEYWORD_TRIAGE_AUDIT_PATH", str(audit_path))
+    
+    assert main.keyword_triage("Routine checkup please").urgency_level == 5
+    
+    lines = audit_path.read_text().splitlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["description_sha256"] == hashlib.sha256(b"Routine checkup please").hexdigest()
+    assert "Routine checkup" not in lines[0]
+
+
+def test_keyword_triage_falls_through_on_red_flags(monkeypatch):
+    monkeypatch.setattr(main, "KEYWORD_TRIAGE_ENABLED", True)
+    assert main.keyword_triage("Prescription refill, also some chest pain today") is None
+    assert main.keyword_triage("Minor cut on finger, bleeding won't stop") is None
+    assert main.keyword_triage("Routine checkup for my newborn") is None
+    assert main.keyword_triage("Headache for 2 days") is None
+    assert main.keyword_triage("Medication refill " + "details " * 40) is None
+    assert main.keyword_triage("Routine checkup please").urgency_level == 5
+    assert main.keyword_triage("Hi, I need to book my annual physical.").urgency_level == 5
+
+
+def test_keyword_triage_rejects_unsafe_routine_phrasing(monkeypatch):
+    monkeypatch.setattr(main, "KEYWORD_TRIAGE_ENABLED", True)
+    unsafe = [
+        "Need an inhaler refill, wheezing all night",
+        "EpiPen refill, I used my last one an hour ago",
+        "Insulin refill, ran out 3 days ago and very thirsty",
+        "Nitroglycerin refill please, ran out yesterday",
+        "I took too many pills, need a refill",
+        "Routine checkup but my heart is racing and palpitations",
+        "Minor cut on my palm from a knife, won't stop oozing",
+        "It's not a minor cut",
+        "Refill for my mother, she fell down the stairs",
+        "Routine checkup overdue, lump in my breast",
+    ]
+    for description in unsafe:
+        assert main.keyword_triage(description) is None, description
+
+
+def test_lifespan_manages_shared_http_client():
+    with TestClient(app) as lifespan_client:
+        http_client = app.state.http
+        assert not http_client.is_closed
+        assert lifespan_client.get("/").status_code == 200
+    assert http_client.is_closed
+
+
+def test_hedged_retry_takes_first_valid_response(monkeypatch):
+    monkeypatch.setattr(main, "HEDGE_ON_RETRY", True)
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+
+    bad_response = MagicMock()
+    bad_response.text = "Urgency is probably level 3, not sure."
+    good_response = MagicMock()
+    good_response.text = _gemini_json(3)
+    calls = []
+
+    async def generate(prompt):
+        calls.append(prompt)
+        if len(calls) == 1:
+            return bad_response
+        # Reformat request keeps failing; the fresh generation succeeds
+        return bad_response if prompt.startswith("The previous response") else good_response
+
+    mock_model.generate_content_async = generate
+
+    result = asyncio.run(analyze_triage_with_gemini("Fever and cough for three days"))
+
+    assert result.urgency_level == 3
+    assert not main.is_safety_fallback(result)
+    assert len(calls) == 3
+
+
+def test_hedged_retry_falls_back_when_both_fail(monkeypatch):
+    monkeypatch.setattr(main, "HEDGE_ON_RETRY", True)
+    mock_model = MagicMock()
+    monkeypatch.setattr(main, "GEMINI_MODEL", mock_model)
+    bad_response = MagicMock()
+    bad_response.text = "not json"
+    mock_model.generate_content_async = AsyncMock(return_value=bad_response)
+
+    result = asyncio.run(analyze_triage_with_gemini("Fever and cough for three days"))
+
+    assert main.is_safety_fallback(result)
+    assert mock_model.generate_content_async.await_count == 3